@@ -0,0 +1,218 @@
+import threading
+from collections import OrderedDict
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ETAG_CACHE_SIZE = 64
+
+
+def create_session(pool=50):
+    """
+    Creates an HTTP session with connection pooling and retries on transient errors.
+
+    When all `pool` connections to a host are busy, further requests wait for
+    a free connection instead of opening throwaway ones. Failed requests,
+    including the stock and price updates, are retried with exponential
+    backoff, honouring Retry-After on 429; the last error response is
+    returned so that `raise_for_status()` reports it.
+
+    Args:
+        pool (int): The maximum number of connections kept open per host.
+
+    Returns:
+        requests.Session: A session reusing keep-alive connections between calls.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=pool,
+        pool_block=True,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST", "PUT"],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def dumps(body):
+    """
+    Serializes a request body to JSON with orjson.
+
+    Datetimes in UTC are written as "2023-01-01T00:00:00Z", numpy scalars and
+    arrays are written as plain numbers.
+
+    Args:
+        body (Any): A JSON-compatible object.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+
+    Examples:
+        >>> dumps({"updatedAt": datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)})
+        b'{"updatedAt":"2023-01-01T00:00:00Z"}'
+    """
+    return orjson.dumps(body, option=orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class MarketClient:
+    """
+    A client for a marketplace API sharing one session between calls.
+
+    The authorization headers are set on the session once, so every request
+    made through the client is authorized.
+
+    Args:
+        base_url (str): The API root URL ending with a slash.
+        auth_headers (dict): Headers authorizing the seller.
+        pool (int): The maximum number of connections kept open per host.
+
+    Examples:
+        >>> with MarketClient("https://api-seller.ozon.ru/", {"Api-Key": "token"}) as client:
+        ...     client.post_json("v2/product/list", {"limit": 1})
+        {"result": {...}}
+    """
+
+    def __init__(self, base_url, auth_headers, pool=50):
+        self.base_url = base_url
+        self.session = create_session(pool)
+        self.session.headers["Content-Type"] = "application/json"
+        self.session.headers.update(auth_headers)
+        self._etags = OrderedDict()
+        self._etags_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, path, **kwargs):
+        """Sends a request and raises an HTTPError on 4xx/5xx."""
+        response = self.session.request(method, self.base_url + path, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def get_json(self, path, params=None):
+        """
+        Sends a GET request and returns the decoded JSON response.
+
+        The raw bodies of the last ETAG_CACHE_SIZE responses with an ETag are
+        kept, and a repeated request carries If-None-Match; on 304 Not Modified
+        the kept body is decoded instead of downloading it again. This only
+        saves requests in long-running processes, where the offer ID caches
+        expire while the client is still alive.
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._etags_lock:
+            etag, content = self._etags.get(key, (None, None))
+        headers = {"If-None-Match": etag} if etag else None
+        response = self.request("GET", path, params=params, headers=headers)
+        if response.status_code != 304:
+            etag, content = response.headers.get("ETag"), response.content
+        if etag:
+            self._remember_etag(key, etag, content)
+        return orjson.loads(content)
+
+    def _remember_etag(self, key, etag, content):
+        """Stores a response body as the most recent one, dropping the oldest beyond ETAG_CACHE_SIZE."""
+        with self._etags_lock:
+            self._etags[key] = (etag, content)
+            self._etags.move_to_end(key)
+            if len(self._etags) > ETAG_CACHE_SIZE:
+                self._etags.popitem(last=False)
+
+    def post_json(self, path, body):
+        """Sends a POST request with a JSON body and returns the decoded JSON response."""
+        return orjson.loads(self.request("POST", path, data=dumps(body)).content)
+
+    def post(self, path, body):
+        """Sends a POST request with a JSON body and returns the response status code."""
+        return self.request("POST", path, data=dumps(body)).status_code
+
+    def put(self, path, body):
+        """Sends a PUT request with a JSON body and returns the response status code."""
+        return self.request("PUT", path, data=dumps(body)).status_code
+
+
+class OzonClient(MarketClient):
+    """
+    A client for the Ozon seller API.
+
+    Args:
+        client_id (str): The client ID for API access.
+        seller_token (str): The API token for the seller's store.
+    """
+
+    def __init__(self, client_id, seller_token, pool=50):
+        super().__init__(
+            "https://api-seller.ozon.ru/",
+            {
+                "Client-Id": client_id,
+                "Api-Key": seller_token,
+            },
+            pool,
+        )
+
+    def get_product_list(self, last_id):
+        payload = {
+            "filter": {
+                "visibility": "ALL",
+            },
+            "last_id": last_id,
+            "limit": 1000,
+        }
+        return self.post_json("v2/product/list", payload).get("result")
+
+    def update_price(self, prices):
+        return self.post("v1/product/import/prices", {"prices": prices})
+
+    def update_stocks(self, stocks):
+        return self.post("v1/product/import/stocks", {"stocks": stocks})
+
+
+class YandexMarketClient(MarketClient):
+    """
+    A client for the Yandex.Market partner API.
+
+    Args:
+        access_token (str): The access token for Yandex.Market API.
+    """
+
+    def __init__(self, access_token, pool=50):
+        super().__init__(
+            "https://api.partner.market.yandex.ru/",
+            {
+                "Authorization": f"Bearer {access_token}",
+                "Accept": "application/json",
+            },
+            pool,
+        )
+
+    def get_product_list(self, page, campaign_id):
+        payload = {
+            "page_token": page,
+            "limit": 200,
+        }
+        path = f"campaigns/{campaign_id}/offer-mapping-entries"
+        return self.get_json(path, payload).get("result")
+
+    def update_stocks(self, stocks, campaign_id):
+        path = f"campaigns/{campaign_id}/offers/stocks"
+        return self.put(path, {"skus": stocks})
+
+    def update_price(self, prices, campaign_id):
+        path = f"campaigns/{campaign_id}/offer-prices/updates"
+        return self.post(path, {"offers": prices})
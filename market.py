@@ -1,15 +1,34 @@
+import asyncio
 import datetime
+import functools
 import logging.config
+from concurrent.futures import ThreadPoolExecutor
 from environs import Env
 from seller import download_stock
 
 import requests
 
-from seller import divide, price_conversion
+from api_client import YandexMarketClient
+from seller import (
+    OFFER_IDS_TTL,
+    SESSION,
+    disk_cache,
+    divide,
+    price_conversion_series,
+    send_chunks,
+    stock_conversion,
+    ttl_cache,
+)
 
 logger = logging.getLogger(__file__)
 
 
+@functools.lru_cache(maxsize=4)
+def _get_client(access_token):
+    """Returns the Yandex.Market client shared by all calls with this token."""
+    return YandexMarketClient(access_token)
+
+
 def get_product_list(page, campaign_id, access_token):
     """
     Retrieves a list of products from Yandex.Market for a specific advertising campaign.
@@ -37,22 +56,7 @@ def get_product_list(page, campaign_id, access_token):
         ...
         requests.exceptions.RequestException
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
-    payload = {
-        "page_token": page,
-        "limit": 200,
-    }
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-mapping-entries"
-    response = requests.get(url, headers=headers, params=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object.get("result")
+    return _get_client(access_token).get_product_list(page, campaign_id)
 
 
 def update_stocks(stocks, campaign_id, access_token):
@@ -65,36 +69,21 @@ def update_stocks(stocks, campaign_id, access_token):
         access_token (str): The access token for Yandex.Market API.
 
     Returns:
-        dict: API response about the update status.
+        int: HTTP status code of the update request.
 
     Raises:
         requests.exceptions.RequestException: Raised when there's an issue with updating stocks in the database.
 
     Examples:
         >>> update_stocks([...], "123456", "your_access_token")
-        {
-            'result': 'success',
-            ...
-        }
+        200
 
         >>> update_stocks([], "123456", "invalid_token")
         Traceback (most recent call last):
         ...
         requests.exceptions.RequestException
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
-    payload = {"skus": stocks}
-    url = endpoint_url + f"campaigns/{campaign_id}/offers/stocks"
-    response = requests.put(url, headers=headers, json=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object
+    return _get_client(access_token).update_stocks(stocks, campaign_id)
 
 
 def update_price(prices, campaign_id, access_token):
@@ -107,73 +96,65 @@ def update_price(prices, campaign_id, access_token):
         access_token (str): The access token for Yandex.Market API.
 
     Returns:
-        dict: API response about the price update status.
+        int: HTTP status code of the price update request.
 
     Raises:
         requests.exceptions.RequestException: Raised when there's an issue with updating the product prices.
 
     Examples:
         >>> update_price([...], "123456", "your_access_token")
-        {
-            'result': 'success',
-            ...
-        }
+        200
 
         >>> update_price([], "123456", "invalid_token")
         Traceback (most recent call last):
         ...
         requests.exceptions.RequestException
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
-    payload = {"offers": prices}
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-prices/updates"
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object
+    return _get_client(access_token).update_price(prices, campaign_id)
 
 
+@ttl_cache(OFFER_IDS_TTL)
+@disk_cache("market-offers", OFFER_IDS_TTL)
 def get_offer_ids(campaign_id, market_token):
     """
     Retrieves product SKUs (Stock Keeping Units) or article numbers from Yandex.Market for an advertising campaign.
 
+    Results are cached in memory and on disk for OFFER_IDS_TTL seconds per campaign.
+
     Args:
         campaign_id (str): The identifier of the advertising campaign.
         market_token (str): The access token for Yandex.Market API.
 
     Returns:
-        list: A list of SKUs (article numbers) for products.
+        tuple: A tuple of SKUs (article numbers) for products.
 
     Raises:
         requests.exceptions.RequestException: Raised when there's an issue with the request, e.g., due to an invalid token.
 
     Examples:
         >>> get_offer_ids("123456", "your_market_token")
-        ['SKU123', 'SKU124', ...]
+        ('SKU123', 'SKU124', ...)
 
         >>> get_offer_ids("123456", "invalid_token")
         Traceback (most recent call last):
         ...
         requests.exceptions.RequestException
     """
-    page = ""
-    product_list = []
-    while True:
-        some_prod = get_product_list(page, campaign_id, market_token)
-        product_list.extend(some_prod.get("offerMappingEntries"))
-        page = some_prod.get("paging").get("nextPageToken")
-        if not page:
-            break
     offer_ids = []
-    for product in product_list:
-        offer_ids.append(product.get("offer").get("shopSku"))
-    return offer_ids
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(get_product_list, "", campaign_id, market_token)
+        while future is not None:
+            some_prod = future.result()
+            page = some_prod.get("paging").get("nextPageToken")
+            future = None
+            # Запросим следующую страницу, пока разбираем текущую
+            if page:
+                future = executor.submit(
+                    get_product_list, page, campaign_id, market_token
+                )
+            for product in some_prod.get("offerMappingEntries"):
+                offer_ids.append(product.get("offer").get("shopSku"))
+    return tuple(offer_ids)
 
 
 def create_stocks(watch_remnants, offer_ids, warehouse_id):
@@ -181,62 +162,40 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
     Constructs a list of stock availability based on the provided product remnants and existing offer IDs.
 
     Args:
-        watch_remnants (list): List of product remnants from the shop's internal system.
-        offer_ids (list): List of product offer IDs (SKUs) from Yandex.Market.
+        watch_remnants (pd.DataFrame): Table of product remnants from the shop's internal system.
+        offer_ids (tuple): Product offer IDs (SKUs) from Yandex.Market.
         warehouse_id (str): The identifier of the warehouse where products are stored.
 
     Returns:
         list: A list of stock availability information for each product.
 
     Examples:
-        >>> create_stocks([{'Код': 'SKU123', 'Количество': '5'}, ...], ['SKU123'], "WH001")
+        >>> create_stocks(pd.DataFrame([{'Код': 'SKU123', 'Количество': '5'}, ...]), ['SKU123'], "WH001")
         [{'sku': 'SKU123', 'warehouseId': 'WH001', 'items': [{'count': 5, ...}]}, ...]
 
-        >>> create_stocks([], [], "WH001")
+        >>> create_stocks(pd.DataFrame(columns=['Код', 'Количество']), [], "WH001")
         []
     """
     # Уберем то, что не загружено в market
-    stocks = list()
-    date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append(
-                {
-                    "sku": str(watch.get("Код")),
-                    "warehouseId": warehouse_id,
-                    "items": [
-                        {
-                            "count": stock,
-                            "type": "FIT",
-                            "updatedAt": date,
-                        }
-                    ],
-                }
-            )
-            offer_ids.remove(str(watch.get("Код")))
+    codes = watch_remnants["Код"].astype(str)
+    watches = watch_remnants[codes.isin(set(offer_ids))].assign(sku=codes)
+    watches = watches.drop_duplicates("sku")
+    watches["stock"] = stock_conversion(watches["Количество"])
+    counts = list(zip(watches["sku"], watches["stock"].tolist()))
     # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
-        stocks.append(
-            {
-                "sku": offer_id,
-                "warehouseId": warehouse_id,
-                "items": [
-                    {
-                        "count": 0,
-                        "type": "FIT",
-                        "updatedAt": date,
-                    }
-                ],
-            }
-        )
-    return stocks
+    found_ids = set(watches["sku"])
+    counts.extend((offer_id, 0) for offer_id in offer_ids if offer_id not in found_ids)
+    date = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    # Общие для всех товаров поля остатка
+    item = {"type": "FIT", "updatedAt": date}
+    return [
+        {
+            "sku": sku,
+            "warehouseId": warehouse_id,
+            "items": [{"count": count, **item}],
+        }
+        for sku, count in counts
+    ]
 
 
 def create_prices(watch_remnants, offer_ids):
@@ -244,64 +203,80 @@ def create_prices(watch_remnants, offer_ids):
     Constructs a list of product prices based on the provided product remnants and existing offer IDs.
 
     Args:
-        watch_remnants (list): List of product remnants from the shop's internal system.
-        offer_ids (list): List of product offer IDs (SKUs) from Yandex.Market.
+        watch_remnants (pd.DataFrame): Table of product remnants from the shop's internal system.
+        offer_ids (tuple): Product offer IDs (SKUs) from Yandex.Market.
 
     Returns:
         list: A list of product price information for each product.
 
     Examples:
-        >>> create_prices([{'Код': 'SKU123', 'Цена': '1000'}, ...], ['SKU123'])
+        >>> create_prices(pd.DataFrame([{'Код': 'SKU123', 'Цена': '1000'}, ...]), ['SKU123'])
         [{'id': 'SKU123', 'price': {'value': 1000, ...}}, ...]
 
-        >>> create_prices([], [])
+        >>> create_prices(pd.DataFrame(columns=['Код', 'Цена']), [])
         []
     """
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "id": str(watch.get("Код")),
-                # "feed": {"id": 0},
-                "price": {
-                    "value": int(price_conversion(watch.get("Цена"))),
-                    # "discountBase": 0,
-                    "currencyId": "RUR",
-                    # "vat": 0,
-                },
-                # "marketSku": 0,
-                # "shopSku": "string",
-            }
-            prices.append(price)
-    return prices
+    codes = watch_remnants["Код"].astype(str)
+    watches = watch_remnants[codes.isin(set(offer_ids))]
+    values = price_conversion_series(watches["Цена"]).astype(int)
+    return [
+        {
+            "id": code,
+            # "feed": {"id": 0},
+            "price": {
+                "value": value,
+                # "discountBase": 0,
+                "currencyId": "RUR",
+                # "vat": 0,
+            },
+            # "marketSku": 0,
+            # "shopSku": "string",
+        }
+        for code, value in zip(codes[watches.index], values.tolist())
+    ]
 
 
-async def upload_prices(watch_remnants, campaign_id, market_token):
+async def upload_prices(watch_remnants, campaign_id, market_token, offer_ids=None):
     """
     Asynchronously uploads product prices to Yandex.Market for a specific advertising campaign.
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
+    if offer_ids is None:
+        offer_ids = get_offer_ids(campaign_id, market_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_prices in list(divide(prices, 500)):
-        update_price(some_prices, campaign_id, market_token)
+    await send_chunks(update_price, divide(prices, 500), campaign_id, market_token)
     return prices
 
 
-async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id):
+async def upload_stocks(
+    watch_remnants, campaign_id, market_token, warehouse_id, offer_ids=None
+):
     """
     Asynchronously uploads product stock counts to Yandex.Market for a specific advertising campaign and warehouse.
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
+    if offer_ids is None:
+        offer_ids = get_offer_ids(campaign_id, market_token)
     stocks = create_stocks(watch_remnants, offer_ids, warehouse_id)
-    for some_stock in list(divide(stocks, 2000)):
-        update_stocks(some_stock, campaign_id, market_token)
+    await send_chunks(update_stocks, divide(stocks, 2000), campaign_id, market_token)
     not_empty = list(
         filter(lambda stock: (stock.get("items")[0].get("count") != 0), stocks)
     )
     return not_empty, stocks
 
 
-def main():
+async def run_campaign(watch_remnants, campaign_id, market_token, warehouse_id):
+    """
+    Asynchronously updates stock counts and prices in Yandex.Market for a specific advertising campaign.
+    """
+    offer_ids = await asyncio.to_thread(get_offer_ids, campaign_id, market_token)
+    # Обновить остатки
+    await upload_stocks(
+        watch_remnants, campaign_id, market_token, warehouse_id, offer_ids
+    )
+    # Поменять цены
+    await upload_prices(watch_remnants, campaign_id, market_token, offer_ids)
+
+
+async def main_async():
     env = Env()
     market_token = env.str("MARKET_TOKEN")
     campaign_fbs_id = env.str("FBS_ID")
@@ -309,31 +284,34 @@ def main():
     warehouse_fbs_id = env.str("WAREHOUSE_FBS_ID")
     warehouse_dbs_id = env.str("WAREHOUSE_DBS_ID")
 
-    watch_remnants = download_stock()
-    try:
-        # FBS
-        offer_ids = get_offer_ids(campaign_fbs_id, market_token)
-        # Обновить остатки FBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_fbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_fbs_id, market_token)
-        # Поменять цены FBS
-        upload_prices(watch_remnants, campaign_fbs_id, market_token)
-
-        # DBS
-        offer_ids = get_offer_ids(campaign_dbs_id, market_token)
-        # Обновить остатки DBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_dbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_dbs_id, market_token)
-        # Поменять цены DBS
-        upload_prices(watch_remnants, campaign_dbs_id, market_token)
-    except requests.exceptions.ReadTimeout:
-        print("Превышено время ожидания...")
-    except requests.exceptions.ConnectionError as error:
-        print(error, "Ошибка соединения")
-    except Exception as error:
-        print(error, "ERROR_2")
+    with SESSION, _get_client(market_token):
+        watch_remnants = download_stock()
+        # Кампании независимы: ошибка в одной не должна прерывать другую
+        results = await asyncio.gather(
+            # FBS
+            run_campaign(
+                watch_remnants, campaign_fbs_id, market_token, warehouse_fbs_id
+            ),
+            # DBS
+            run_campaign(
+                watch_remnants, campaign_dbs_id, market_token, warehouse_dbs_id
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, requests.exceptions.ReadTimeout):
+                print("Превышено время ожидания...")
+            elif isinstance(result, requests.exceptions.ConnectionError):
+                print(result, "Ошибка соединения")
+            elif isinstance(result, Exception):
+                print(result, "ERROR_2")
+            elif isinstance(result, BaseException):
+                # Например, CancelledError: кампанию нельзя считать выполненной
+                raise result
+
+
+def main():
+    asyncio.run(main_async())
 
 
 if __name__ == "__main__":
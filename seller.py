@@ -1,15 +1,126 @@
+import asyncio
+import functools
 import io
 import logging.config
 import os
 import re
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from environs import Env
 
+import orjson
 import pandas as pd
 import requests
 
+from api_client import OzonClient, create_session
+
 logger = logging.getLogger(__file__)
 
+MAX_CONCURRENT_REQUESTS = 5
+OFFER_IDS_TTL = 300
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "offers")
+_PRICE_RE = re.compile(r"[^0-9]")
+_STOCK_MAP = {">10": 100, "1": 0}
+
+
+SESSION = create_session()
+
+
+@functools.lru_cache(maxsize=4)
+def _get_client(client_id, seller_token):
+    """Returns the Ozon client shared by all calls with these credentials."""
+    return OzonClient(client_id, seller_token)
+
+
+def ttl_cache(ttl: float):
+    """
+    Caches the results of a function by its positional arguments for `ttl` seconds.
+
+    Args:
+        ttl (float): How long a cached result stays valid, in seconds.
+
+    Returns:
+        Callable: A decorator; the wrapped function gets a `cache_clear()` method.
+
+    Examples:
+        >>> @ttl_cache(300)
+        ... def get_ids(client_id):
+        ...     return ("123", "456")
+    """
+
+    def decorator(func):
+        cache = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            cached = cache.get(args)
+            if cached is not None and now - cached[0] < ttl:
+                return cached[1]
+            result = func(*args)
+            cache[args] = (now, result)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def disk_cache(name: str, ttl: float):
+    """
+    Stores the results of a function in CACHE_DIR for `ttl` seconds, so they survive between runs.
+
+    Only the first argument of the function (e.g. a campaign ID) is used as the
+    cache key, so tokens passed after it are never written to disk. The function
+    must return a sequence of JSON-serializable values; cached results are
+    returned as tuples. CACHE_DIR lies next to this script, and failing to
+    write it is logged but does not fail the call.
+
+    Args:
+        name (str): A prefix of the cache file names, unique per function.
+        ttl (float): How long a cached result stays valid, in seconds.
+
+    Returns:
+        Callable: A decorator for functions taking the cache key as the first argument.
+
+    Examples:
+        >>> @disk_cache("ozon-offers", 300)
+        ... def get_ids(client_id, seller_token):
+        ...     return ("123", "456")
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(key, *args):
+            path = os.path.join(CACHE_DIR, f"{name}-{key}.json")
+            try:
+                if time.time() - os.path.getmtime(path) < ttl:
+                    with open(path, "rb") as cache_file:
+                        return tuple(orjson.loads(cache_file.read()))
+            except (OSError, orjson.JSONDecodeError):
+                pass
+            result = func(key, *args)
+            temp_path = f"{path}.{os.getpid()}"
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                with open(temp_path, "wb") as cache_file:
+                    cache_file.write(orjson.dumps(result))
+                os.replace(temp_path, path)
+            except OSError as error:
+                # Кэш необязателен: без него просто не сэкономим запросы
+                logger.warning("Не удалось сохранить кэш %s: %s", path, error)
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            return result
+
+        return wrapper
+
+    return decorator
+
 
 def get_product_list(last_id, client_id, seller_token):
     """
@@ -33,34 +144,23 @@ def get_product_list(last_id, client_id, seller_token):
         >>> get_product_list("012345", "YOUR_CLIENT_ID", "YOUR_SELLER_TOKEN")
         {"items": [{"product_id": 123, "name": "Watch", ...}], ...}
     """
-    url = "https://api-seller.ozon.ru/v2/product/list"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
-    payload = {
-        "filter": {
-            "visibility": "ALL",
-        },
-        "last_id": last_id,
-        "limit": 1000,
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object.get("result")
+    return _get_client(client_id, seller_token).get_product_list(last_id)
 
 
+@ttl_cache(OFFER_IDS_TTL)
+@disk_cache("ozon-offers", OFFER_IDS_TTL)
 def get_offer_ids(client_id, seller_token):
     """
     Retrieves a list of offer IDs from the server.
 
+    Results are cached in memory and on disk for OFFER_IDS_TTL seconds per client.
+
     Args:
         client_id (str): The client's ID.
         seller_token (str): The seller's authentication token.
 
     Returns:
-        List[str]: A list of strings, each representing an offer ID.
+        Tuple[str, ...]: A tuple of strings, each representing an offer ID.
 
     Raises:
         Exception: Invalid client_id or seller_token, or a server-side error may result in retrieval failure.
@@ -68,21 +168,29 @@ def get_offer_ids(client_id, seller_token):
     Examples:
         # Assuming an initialized server with available offer IDs.
         >>> get_offer_ids("client_123", "token_456")
-        ["123", "456", "789", ...]
+        ("123", "456", "789", ...)
     """
-    last_id = ""
-    product_list = []
-    while True:
-        some_prod = get_product_list(last_id, client_id, seller_token)
-        product_list.extend(some_prod.get("items"))
-        total = some_prod.get("total")
-        last_id = some_prod.get("last_id")
-        if total == len(product_list):
-            break
     offer_ids = []
-    for product in product_list:
-        offer_ids.append(product.get("offer_id"))
-    return offer_ids
+    received = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(get_product_list, "", client_id, seller_token)
+        while future is not None:
+            some_prod = future.result()
+            items = some_prod.get("items")
+            received += len(items)
+            future = None
+            # Запросим следующую страницу, пока разбираем текущую.
+            # Она зависит от last_id текущей, поэтому глубже заглядывать нельзя.
+            if items and received < some_prod.get("total"):
+                future = executor.submit(
+                    get_product_list,
+                    some_prod.get("last_id"),
+                    client_id,
+                    seller_token,
+                )
+            for product in items:
+                offer_ids.append(product.get("offer_id"))
+    return tuple(offer_ids)
 
 
 def update_price(prices: list, client_id, seller_token):
@@ -95,24 +203,16 @@ def update_price(prices: list, client_id, seller_token):
         seller_token (str): The seller's authentication token.
 
     Returns:
-        None: This function returns nothing, but it updates the prices on the server side.
+        int: HTTP status code of the update request.
 
     Raises:
         Exception: Invalid client_id or seller_token, or a server-side error may result in update failure.
 
     Examples:
         >>> update_price([{"offer_id": "123", "price": "5990"}], "client_123", "token_456")
-        # No return value, but the price for offer_id "123" has been updated to "5990" on the server.
+        200
     """
-    url = "https://api-seller.ozon.ru/v1/product/import/prices"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
-    payload = {"prices": prices}
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return _get_client(client_id, seller_token).update_price(prices)
 
 
 def update_stocks(stocks: list, client_id, seller_token):
@@ -125,32 +225,24 @@ def update_stocks(stocks: list, client_id, seller_token):
         seller_token (str): The seller's authentication token.
 
     Returns:
-        None: This function returns nothing, but it updates the stocks on the server side.
+        int: HTTP status code of the update request.
 
     Raises:
         Exception: Invalid client_id or seller_token, or a server-side error may result in update failure.
 
     Examples:
         >>> update_stocks([{"offer_id": "123", "stock": 5}], "client_123", "token_456")
-        # No return value, but the stock for offer_id "123" has been updated to 5 on the server.
+        200
     """
-    url = "https://api-seller.ozon.ru/v1/product/import/stocks"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
-    payload = {"stocks": stocks}
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return _get_client(client_id, seller_token).update_stocks(stocks)
 
 
 def download_stock():
     """
-    Downloads a list of watch remnants (stock) from the CASIO website.
+    Downloads a table of watch remnants (stock) from the CASIO website.
 
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries, each representing a watch remnant.
+        pd.DataFrame: A table with a row per watch remnant.
 
     Raises:
         Exception: Server connection issues or unavailability may result in download errors.
@@ -158,24 +250,24 @@ def download_stock():
     Examples:
         # Assuming an initialized server with available data.
         >>> download_stock()
-        [{"Код": "123", "Количество": "5", ...}, ...]
+             Код Количество           Цена  ...
+        0    123          5  5'990.00 руб.  ...
     """
     # Скачать остатки с сайта
     casio_url = "https://timeworld.ru/upload/files/ostatki.zip"
-    session = requests.Session()
-    response = session.get(casio_url)
+    response = SESSION.get(casio_url)
     response.raise_for_status()
+    # Создаем список остатков часов, не распаковывая архив на диск:
     with response, zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-        archive.extractall(".")
-    # Создаем список остатков часов:
-    excel_file = "ostatki.xls"
-    watch_remnants = pd.read_excel(
-        io=excel_file,
-        na_values=None,
-        keep_default_na=False,
-        header=17,
-    ).to_dict(orient="records")
-    os.remove("./ostatki.xls")  # Удалить файл
+        with archive.open("ostatki.xls") as excel_file:
+            watch_remnants = pd.read_excel(
+                io=excel_file,
+                engine="xlrd",
+                usecols=["Код", "Количество", "Цена"],
+                na_values=None,
+                keep_default_na=False,
+                header=17,
+            )
     return watch_remnants
 
 
@@ -184,38 +276,35 @@ def create_stocks(watch_remnants, offer_ids):
     Generates a list of stocks based on available watch remnants and offer IDs.
 
     Args:
-        watch_remnants (List[Dict[str, Any]]): A list of watches with their details.
-        offer_ids (List[str]): A list of available offer IDs.
+        watch_remnants (pd.DataFrame): A table of watches with their details.
+        offer_ids (Tuple[str, ...]): Available offer IDs.
 
     Returns:
         List[Dict[str, Union[str, int]]]: A list of dictionaries, each representing a stock entry.
 
     Raises:
-        ValueError: Unexpected data format may yield incorrect stock entries.
+        KeyError: The table has no "Код" or "Количество" column.
 
     Examples:
-        >>> create_stocks([{"Код": "123", "Количество": "5"}], ["123"])
+        >>> create_stocks(pd.DataFrame([{"Код": "123", "Количество": "5"}]), ["123"])
         [{"offer_id": "123", "stock": 5}]
 
-        >>> create_stocks([{"WrongKey": "123"}], ["123"])
+        >>> create_stocks(pd.DataFrame([{"Код": "456", "Количество": "5"}]), ["123"])
         [{"offer_id": "123", "stock": 0}]
     """
     # Уберем то, что не загружено в seller
-    stocks = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append({"offer_id": str(watch.get("Код")), "stock": stock})
-            offer_ids.remove(str(watch.get("Код")))
+    codes = watch_remnants["Код"].astype(str)
+    watches = watch_remnants[codes.isin(set(offer_ids))].assign(offer_id=codes)
+    watches = watches.drop_duplicates("offer_id")
+    watches["stock"] = stock_conversion(watches["Количество"])
+    stocks = watches[["offer_id", "stock"]].to_dict(orient="records")
     # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
-        stocks.append({"offer_id": offer_id, "stock": 0})
+    found_ids = set(watches["offer_id"])
+    stocks.extend(
+        {"offer_id": offer_id, "stock": 0}
+        for offer_id in offer_ids
+        if offer_id not in found_ids
+    )
     return stocks
 
 
@@ -224,31 +313,31 @@ def create_prices(watch_remnants, offer_ids):
     Generates a list of prices based on available watch remnants and offer IDs.
 
     Args:
-        watch_remnants (List[Dict[str, Any]]): A list of watches with their details.
-        offer_ids (List[str]): A list of available offer IDs.
+        watch_remnants (pd.DataFrame): A table of watches with their details.
+        offer_ids (Tuple[str, ...]): Available offer IDs.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries, each representing a price entry.
 
     Raises:
-        ValueError: Unexpected data format may yield incorrect price entries.
+        KeyError: The table has no "Код" or "Цена" column.
 
     Examples:
-        >>> create_prices([{"Код": "123", "Цена": "5'990.00 руб."}], ["123"])
+        >>> create_prices(pd.DataFrame([{"Код": "123", "Цена": "5'990.00 руб."}]), ["123"])
         [{"auto_action_enabled": "UNKNOWN", "currency_code": "RUB", "offer_id": "123", "old_price": "0", "price": "5990"}]
     """
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "auto_action_enabled": "UNKNOWN",
-                "currency_code": "RUB",
-                "offer_id": str(watch.get("Код")),
-                "old_price": "0",
-                "price": price_conversion(watch.get("Цена")),
-            }
-            prices.append(price)
-    return prices
+    codes = watch_remnants["Код"].astype(str)
+    watches = watch_remnants[codes.isin(set(offer_ids))]
+    prices = pd.DataFrame(
+        {
+            "auto_action_enabled": "UNKNOWN",
+            "currency_code": "RUB",
+            "offer_id": codes[watches.index],
+            "old_price": "0",
+            "price": price_conversion_series(watches["Цена"]),
+        }
+    )
+    return prices.to_dict(orient="records")
 
 
 def price_conversion(price: str) -> str:
@@ -274,7 +363,49 @@ def price_conversion(price: str) -> str:
         >>> price_conversion("Some random text")
         'Some'
     """
-    return re.sub("[^0-9]", "", price.split(".")[0])
+    return _PRICE_RE.sub("", price.split(".", 1)[0])
+
+
+def price_conversion_series(prices: pd.Series) -> pd.Series:
+    """
+    Converts a column of price strings into a numerical format.
+
+    This is the vectorized counterpart of `price_conversion`.
+
+    Args:
+        prices (pd.Series): The "Цена" column of the remnants table.
+
+    Returns:
+        pd.Series: Prices in numerical format, represented as strings.
+
+    Examples:
+        >>> price_conversion_series(pd.Series(["5'990.00 руб."])).tolist()
+        ['5990']
+    """
+    prices = prices.astype(str).str.split(".", n=1).str[0]
+    return prices.str.replace(_PRICE_RE, "", regex=True)
+
+
+def stock_conversion(counts: pd.Series) -> pd.Series:
+    """
+    Converts remnant counts from the CASIO table into stock values.
+
+    ">10" becomes 100, "1" becomes 0 and any other value is parsed as a number;
+    values that are not numbers become 0.
+
+    Args:
+        counts (pd.Series): The "Количество" column of the remnants table.
+
+    Returns:
+        pd.Series: Stock values as integers.
+
+    Examples:
+        >>> stock_conversion(pd.Series([">10", "1", 5, "abc"])).tolist()
+        [100, 0, 5, 0]
+    """
+    counts = counts.astype(str)
+    stocks = counts.map(_STOCK_MAP).fillna(pd.to_numeric(counts, errors="coerce"))
+    return stocks.fillna(0).astype(int)
 
 
 def divide(lst: list, n: int):
@@ -302,46 +433,91 @@ def divide(lst: list, n: int):
         yield lst[i : i + n]
 
 
-async def upload_prices(watch_remnants, client_id, seller_token):
+async def send_chunks(update, chunks, *args):
+    """
+    Sends every chunk with the given update function concurrently.
+
+    Each call runs in a worker thread on the shared session; at most
+    MAX_CONCURRENT_REQUESTS calls are in flight at once. All chunks are sent
+    even if some of them fail, then the first error is raised.
+
+    Args:
+        update (Callable): A blocking update function, e.g. `update_stocks`.
+        chunks (Iterable[List[Any]]): Chunks to pass as the first argument of `update`.
+        *args: Remaining arguments of `update`.
+
+    Returns:
+        List[Any]: Results of `update` in the order of chunks.
+
+    Raises:
+        Exception: The first error raised by any of the calls.
+
+    Examples:
+        >>> asyncio.run(send_chunks(update_stocks, divide(stocks, 100), "client_123", "token_456"))
+        [200, 200, ...]
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def send(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(update, chunk, *args)
+
+    results = await asyncio.gather(
+        *(send(chunk) for chunk in chunks), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+async def upload_prices(watch_remnants, client_id, seller_token, offer_ids=None):
     """Asynchronously uploads prices based on available watch remnants to a server."""
-    offer_ids = get_offer_ids(client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = get_offer_ids(client_id, seller_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_price in list(divide(prices, 1000)):
-        update_price(some_price, client_id, seller_token)
+    await send_chunks(update_price, divide(prices, 1000), client_id, seller_token)
     return prices
 
 
-async def upload_stocks(watch_remnants, client_id, seller_token):
+async def upload_stocks(watch_remnants, client_id, seller_token, offer_ids=None):
     """Asynchronously uploads stocks based on available watch remnants to a server."""
-    offer_ids = get_offer_ids(client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = get_offer_ids(client_id, seller_token)
     stocks = create_stocks(watch_remnants, offer_ids)
-    for some_stock in list(divide(stocks, 100)):
-        update_stocks(some_stock, client_id, seller_token)
+    await send_chunks(update_stocks, divide(stocks, 100), client_id, seller_token)
     not_empty = list(filter(lambda stock: (stock.get("stock") != 0), stocks))
     return not_empty, stocks
 
 
-def main():
+async def main_async():
     env = Env()
     seller_token = env.str("SELLER_TOKEN")
     client_id = env.str("CLIENT_ID")
-    try:
-        offer_ids = get_offer_ids(client_id, seller_token)
-        watch_remnants = download_stock()
-        # Обновить остатки
-        stocks = create_stocks(watch_remnants, offer_ids)
-        for some_stock in list(divide(stocks, 100)):
-            update_stocks(some_stock, client_id, seller_token)
-        # Поменять цены
-        prices = create_prices(watch_remnants, offer_ids)
-        for some_price in list(divide(prices, 900)):
-            update_price(some_price, client_id, seller_token)
-    except requests.exceptions.ReadTimeout:
-        print("Превышено время ожидания...")
-    except requests.exceptions.ConnectionError as error:
-        print(error, "Ошибка соединения")
-    except Exception as error:
-        print(error, "ERROR_2")
+    with SESSION, _get_client(client_id, seller_token):
+        try:
+            offer_ids = get_offer_ids(client_id, seller_token)
+            watch_remnants = download_stock()
+            # Обновить остатки
+            stocks = create_stocks(watch_remnants, offer_ids)
+            await send_chunks(
+                update_stocks, divide(stocks, 100), client_id, seller_token
+            )
+            # Поменять цены
+            prices = create_prices(watch_remnants, offer_ids)
+            await send_chunks(
+                update_price, divide(prices, 900), client_id, seller_token
+            )
+        except requests.exceptions.ReadTimeout:
+            print("Превышено время ожидания...")
+        except requests.exceptions.ConnectionError as error:
+            print(error, "Ошибка соединения")
+        except Exception as error:
+            print(error, "ERROR_2")
+
+
+def main():
+    asyncio.run(main_async())
 
 
 if __name__ == "__main__":